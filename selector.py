@@ -0,0 +1,617 @@
+# selector.py — MicroPython (Raspberry Pi Pico)
+# 8台PCを1組のUSB HID(Keyboard/Mouse)で切替
+# 方針:
+#  - 各ICはクラス化 (MCP23017 / TS3USB30 / PI3USB14 / 74HC137)
+#  - セレクタ制御をクラス化 (Usb8Selector)
+#  - PCごとに必要ピン状態をPCクラスで保持 (SW/LED/MUX選択/TS3側/HC137アドレス)
+#
+# 仕様:
+#  - 初期は全PC切断 (TS3=OE High, PI3USB14 A/B Disable, 74HC137 ~E1 High)
+#  - SWを押して離したタイミングで選択
+#  - 選択PCのLEDのみ点灯 (LED=Active Low)
+#
+# ピン対応（論理名＝物理番号）
+#  TS3USB30-OE = GP00(物理1)
+#  TS3USB30-S  = GP01(物理2)
+#  PI3USB14A-~EN = GP02(物理4)
+#  PI3USB14A-S1  = GP03(物理5)
+#  PI3USB14A-S0  = GP04(物理6)
+#  PI3USB14B-~EN = GP06(物理9)
+#  PI3USB14B-S1  = GP07(物理10)
+#  PI3USB14B-S0  = GP08(物理11)
+#  74HC137-~E1   = GP19(物理25)
+#  74HC137-A2    = GP20(物理26)
+#  74HC137-A1    = GP21(物理27)
+#  74HC137-A0    = GP22(物理29)
+#  MCP23017-SDA  = GP16(物理21) → MCP23017 物理13
+#  MCP23017-SCL  = GP17(物理22) → MCP23017 物理12
+#  MCP23017-INTA = GP18(物理24) → MCP23017 物理20
+#
+# TS3USB30の結線
+#  D1: PI3USB14(B側)  / S=0でD1
+#  D2: PI3USB14(A側)  / S=1でD2
+#
+# MCP23017の結線（LEDはActive Low）
+#  GPA7:SW0, GPA6:SW1, GPA5:SW2, GPA4:SW3, GPA3:SW4, GPA2:SW5, GPA1:SW6, GPA0:SW7
+#  GPB0:LED0, GPB1:LED1, GPB2:LED2, GPB3:LED3, GPB4:LED4, GPB5:LED5, GPB6:LED6, GPB7:LED7
+
+from machine import Pin, I2C, Timer, mem32
+import micropython
+from micropython import const
+import utime
+import sys
+import select
+
+DEBUG_MODE = True # Set to False for production
+
+# ========= MCP23017 Register Map (Bank=0) =========
+# const()+先頭アンダースコアでコンパイル時に即値へ展開され、
+# モジュール辞書からも省かれる（LOAD_GLOBAL引き→即値ロード）
+_IODIRA   = const(0x00)
+_IODIRB   = const(0x01)
+_IPOLA    = const(0x02)
+_IPOLB    = const(0x03)
+_GPINTENA = const(0x04)
+_GPINTENB = const(0x05)
+_DEFVALA  = const(0x06)
+_DEFVALB  = const(0x07)
+_INTCONA  = const(0x08)
+_INTCONB  = const(0x09)
+_IOCON    = const(0x0A)  # also 0x0B when BANK=0
+_GPPUA    = const(0x0C)
+_GPPUB    = const(0x0D)
+_INTFA    = const(0x0E)
+_INTFB    = const(0x0F)
+_INTCAPA  = const(0x10)
+_INTCAPB  = const(0x11)
+_GPIOA    = const(0x12)
+_GPIOB    = const(0x13)
+_OLATA    = const(0x14)
+_OLATB    = const(0x15)
+
+# ========= RP2040 SIO (GPIO一括操作用MMIO) =========
+_SIO_GPIO_OUT_SET = const(0xD0000014)
+_SIO_GPIO_OUT_CLR = const(0xD0000018)
+_SIO_GPIO_OE_SET  = const(0xD0000024)
+# 出力ピン: TS3(GP0,1) / MuxA(GP2-4) / MuxB(GP6-8) / HC137(GP19-22)
+_OUT_PIN_MASK  = const(0b0111_1000_0000_0001_1101_1111)
+# 初期High(=全切断): TS3 S(GP1)のみLow
+_OUT_INIT_HIGH = const(_OUT_PIN_MASK & ~(1 << 1))
+
+# ================= IC Driver Classes =================
+
+class MCP23017:
+    def __init__(self, i2c: I2C, addr=0x20, inta_pin=None):
+        self.i2c = i2c
+        self.addr = addr
+        self.inta_pin = inta_pin  # machine.Pin for INTA (active low)
+        # 書込バッファを事前確保し、運用中の書込を割り当てゼロにする
+        # （ボトムハーフ文脈でのgc圧迫・MemoryError回避）
+        self._wbuf2 = bytearray(2)   # reg + 1バイト
+        self._wbuf3 = bytearray(3)   # reg + 2バイト (OLATペア)
+        self._writeto = self.i2c.writeto  # 束縛済みメソッドをキャッシュ
+        # IOCON: SEQOP=0(逐次アドレス有効), BANK=0 → 以降はバースト転送可能
+        self._write8(_IOCON, 0b00000000)
+        # IODIRA..OLATB (0x00..0x15) を1バーストで設定（I2Cトランザクション1回）
+        #  A: 入力(スイッチ), プルアップ有効 / B: 出力(LED Active Low) 初期は全消灯(=全1)
+        #  割り込み: Aポートの変化割り込み, 全bit有効
+        #  INTF/INTCAP (0x0E..0x11) はRead-Onlyなので書込値は無視される
+        self._writeN(_IODIRA, bytes([
+            0xFF, 0x00,  # IODIRA, IODIRB
+            0x00, 0x00,  # IPOLA, IPOLB
+            0xFF, 0x00,  # GPINTENA, GPINTENB
+            0xFF, 0x00,  # DEFVALA(待機=1), DEFVALB
+            0xFF, 0x00,  # INTCONA(DEFVAL比較=押下エッジのみ), INTCONB
+            0x00, 0x00,  # IOCON, IOCON
+            0xFF, 0x00,  # GPPUA, GPPUB
+            0x00, 0x00,  # INTFA, INTFB (R/O)
+            0x00, 0x00,  # INTCAPA, INTCAPB (R/O)
+            0xFF, 0xFF,  # GPIOA, GPIOB (→OLATへ書込)
+            0xFF, 0xFF,  # OLATA, OLATB
+        ]))
+        # 初回読出しでラッチ解除
+        self.read_gpioa()
+
+    def _write8(self, reg, val):
+        buf = self._wbuf2
+        buf[0] = reg
+        buf[1] = val
+        self._writeto(self.addr, buf)
+
+    def _writeN(self, reg, bytes_):
+        # SEQOP=0前提: レジスタアドレス＋データ列を1トランザクションで連続書込
+        # （初期化時のみ使用なのでここは割り当てを許容）
+        self._writeto(self.addr, bytes([reg]) + bytes_)
+
+    def _read8(self, reg) -> int:
+        return self.i2c.readfrom_mem(self.addr, reg, 1)[0]
+
+    def read_gpioa(self) -> int:
+        return self._read8(_GPIOA)
+
+    def read_ab(self):
+        """ GPIOA/GPIOBを2バイト1トランザクションで読出し (a, b) を返す """
+        buf = self.i2c.readfrom_mem(self.addr, _GPIOA, 2)
+        return buf[0], buf[1]
+
+    def read_intcap_ab(self):
+        """
+        INTCAPA/INTCAPBを2バイト1トランザクションで読出し (a, b) を返す。
+        INTCAPは割り込み発生時点のポート状態のスナップショットで、
+        読出しで割り込みラッチも解除される。
+        """
+        buf = self.i2c.readfrom_mem(self.addr, _INTCAPA, 2)
+        return buf[0], buf[1]
+
+    def read_int_status(self):
+        """
+        INTFA..INTCAPB (0x0E..0x11) を4バイト1トランザクションで読出し、
+        (intf_a, intcap_a) を返す。INTFは割り込み要因ピン、INTCAPは
+        発生時点のポート状態。どのSWがどちらのエッジで割り込んだかが
+        再構成なしで直接わかる。
+        """
+        buf = self.i2c.readfrom_mem(self.addr, _INTFA, 4)
+        return buf[0], buf[2]
+
+    def write_olat_ab(self, a: int, b: int):
+        """ OLATA/OLATBを2バイト1トランザクションで書込（SEQOP=0前提） """
+        buf = self._wbuf3
+        buf[0] = _OLATA
+        buf[1] = a & 0xFF
+        buf[2] = b & 0xFF
+        self._writeto(self.addr, buf)
+
+    def write_leds16(self, word16: int):
+        """
+        OLATA(下位byte)/OLATB(上位byte)を16bit値として1トランザクションで書込。
+        将来LEDを16本に拡張してもI2C往復は増えない。
+        """
+        self.write_olat_ab(word16 & 0xFF, (word16 >> 8) & 0xFF)
+
+    def set_led_only(self, index: int):
+        """
+        LEDはActive Low。index(0-7)のみ点灯(=0)、他は消灯(=1)。
+        index<0 のときは全消灯（=0xFF）。
+        """
+        mask = 0xFF if index < 0 else (0xFF & ~(1 << index))
+        # OLATAは未使用(0xFF維持)・OLATBがLED。16bit書込1回で両latchを確定
+        self.write_leds16((mask << 8) | 0xFF)
+
+class PI3USB14:
+    """ 4:1 ハイスピードUSBスイッチ (~EN: Lowで有効, S1,S0: 2bit選択0..3) """
+    def __init__(self, en_n_pin: Pin, s1_pin: Pin, s0_pin: Pin, name="A"):
+        self.en_n = en_n_pin; self.s1 = s1_pin; self.s0 = s0_pin
+        self.name = name
+        for p in (self.en_n, self.s1, self.s0):
+            p.init(Pin.OUT, value=1)  # 既定: Disable
+        # 束縛済みvalueメソッドをキャッシュ（attr引き→C関数直接呼出しに）
+        self._env = self.en_n.value
+        self._s1v = self.s1.value
+        self._s0v = self.s0.value
+        self.disable()
+
+    def select(self, port0123: int):
+        p = max(0, min(3, port0123))
+        self._s0v(p & 1)
+        self._s1v((p >> 1) & 1)
+
+    def enable(self):
+        self._env(0)
+
+    def disable(self):
+        self._env(1)
+        
+    def debug_print(self):
+        # mpy-cross -O2以上では__debug__=Falseに畳み込まれ本体ごと消える
+        if __debug__:
+            print(self.name)
+
+class TS3USB30:
+    """ 2:1 ハイスピードUSBスイッチ (OE:0=Enable, S=0:D1(B側), S=1:D2(A側)) """
+    def __init__(self, oe_pin: Pin, s_pin: Pin):
+        self.oe = oe_pin; self.s = s_pin
+        self.oe.init(Pin.OUT, value=1)  # 初期: 切断
+        self.s.init(Pin.OUT, value=0)   # 既定: B側(D1)
+        self._oev = self.oe.value
+        self._sv = self.s.value
+
+    def route_to_A(self): self._sv(1)
+    def route_to_B(self): self._sv(0)
+    def enable(self):     self._oev(0)
+    def disable(self):    self._oev(1)
+
+class HC137:
+    """ 74HC137 3→8デコーダ (~E1:Highで全OFF, A2..A0: アドレス, 選択YのみLow) """
+    def __init__(self, e1_n: Pin, a2: Pin, a1: Pin, a0: Pin):
+        self.e1_n = e1_n; self.a2 = a2; self.a1 = a1; self.a0 = a0
+        for p in (self.e1_n, self.a2, self.a1, self.a0):
+            p.init(Pin.OUT, value=1)
+        self._e1v = self.e1_n.value
+        self._a2v = self.a2.value
+        self._a1v = self.a1.value
+        self._a0v = self.a0.value
+        self.all_off()
+
+    def all_off(self):
+        self._e1v(1)  # 全出力High（=CH217K全OFF）
+
+    def select_addr(self, addr: int):
+        """ E1は変更しないで、A2..A0のみセット """
+        a = max(0, min(7, addr))
+        self._a0v(a & 1)
+        self._a1v((a >> 1) & 1)
+        self._a2v((a >> 2) & 1)
+
+    def enable(self):  self._e1v(0)
+    def disable(self): self._e1v(1)
+
+# ================= PC Class =================
+class PC:
+    """
+    各PCの“必要ピン状態”を保持するデータクラス
+      - index: 0..7
+      - sw_bit: MCP23017 GPAのビット位置 (SWn → GPAビット)
+      - led_bit: MCP23017 GPBのビット位置 (LEDn → GPBビット, Active Low)
+      - mux_side: 'A' or 'B'
+      - mux_sel: 0..3 (PI3USB14のS1,S0)
+      - ts3_side: 'A' or 'B' (TS3USB30のS)
+      - hc_addr: 0..7 (74HC137のアドレス A2..A0、E1はLowで有効)
+    """
+    def __init__(self, index, sw_bit, led_bit, mux_side, mux_sel, ts3_side, hc_addr):
+        self.index = index
+        self.sw_bit = sw_bit
+        self.led_bit = led_bit
+        self.mux_side = mux_side
+        self.mux_sel = mux_sel
+        self.ts3_side = ts3_side
+        self.hc_addr = hc_addr
+
+    def __repr__(self):
+        return ("<PC{idx}: SW=GPA{sw}, LED=GPB{led}, PI3{side}[{sel}], TS3={ts3}, HC137={hc}>"
+                .format(idx=self.index, sw=self.sw_bit, led=self.led_bit,
+                        side=self.mux_side, sel=self.mux_sel,
+                        ts3=self.ts3_side, hc=self.hc_addr))
+    
+    def debug_print(self):
+        if __debug__:
+            print(self.__repr__())
+
+# ================= Selector =================
+class Usb8Selector:
+    """
+    上位制御:
+      - UI: MCP23017 (GPA=SW, GPB=LED Active Low)
+      - データ経路: TS3USB30 + PI3USB14(A/B)
+      - VBUS: 74HC137 (→ CH217K)
+      - PCテーブル: PCクラスの配列で一元管理
+    """
+    def __init__(self, debug_mode=False):
+        self.debug_mode = debug_mode
+        # ==== ハード初期化 ====
+        self.ts3 = TS3USB30(Pin(0, Pin.OUT), Pin(1, Pin.OUT))
+        self.muxA = PI3USB14(Pin(2, Pin.OUT), Pin(3, Pin.OUT), Pin(4, Pin.OUT), name="A")
+        self.muxB = PI3USB14(Pin(6, Pin.OUT), Pin(7, Pin.OUT), Pin(8, Pin.OUT), name="B")
+        self.hc137 = HC137(Pin(19, Pin.OUT), Pin(20, Pin.OUT), Pin(21, Pin.OUT), Pin(22, Pin.OUT))
+
+        # SIOレジスタへの一括書込で全出力ピンの初期レベル/方向を同時確定。
+        # Pinオブジェクト(.value() API用)は上で構築済み。個別初期化に頼らず
+        # MMIO 3回で「全切断」状態をアトミックに再アサートする
+        mem32[_SIO_GPIO_OUT_SET] = _OUT_INIT_HIGH
+        mem32[_SIO_GPIO_OUT_CLR] = _OUT_PIN_MASK & ~_OUT_INIT_HIGH
+        mem32[_SIO_GPIO_OE_SET]  = _OUT_PIN_MASK
+
+        self.i2c = I2C(0, sda=Pin(16), scl=Pin(17), freq=400000)
+        self.inta_pin = Pin(18, Pin.IN, Pin.PULL_UP)  # INTAはActive Low
+        self.io = MCP23017(self.i2c, addr=0x20, inta_pin=self.inta_pin)
+
+        # ==== PCテーブル ====
+        # SW割付: SW0..7 → GPA7..0（ご指定）
+        # LED割付: LED0..7 → GPB0..7（Active Low）
+        self.pcs = [
+            PC(index=0, sw_bit=7, led_bit=0, mux_side='B', mux_sel=3, ts3_side='B', hc_addr=0),  # A:000
+            PC(index=1, sw_bit=6, led_bit=1, mux_side='B', mux_sel=2, ts3_side='B', hc_addr=1),  # A:001
+            PC(index=2, sw_bit=5, led_bit=2, mux_side='B', mux_sel=1, ts3_side='B', hc_addr=2),  # A:010
+            PC(index=3, sw_bit=4, led_bit=3, mux_side='B', mux_sel=0, ts3_side='B', hc_addr=3),  # A:011
+            PC(index=4, sw_bit=3, led_bit=4, mux_side='A', mux_sel=3, ts3_side='A', hc_addr=4),  # B:100
+            PC(index=5, sw_bit=2, led_bit=5, mux_side='A', mux_sel=2, ts3_side='A', hc_addr=5),  # B:101
+            PC(index=6, sw_bit=1, led_bit=6, mux_side='A', mux_sel=1, ts3_side='A', hc_addr=6),  # B:110
+            PC(index=7, sw_bit=0, led_bit=7, mux_side='A', mux_sel=0, ts3_side='A', hc_addr=7),  # B:111
+        ]
+        # SWビット→PCインデックスの逆引き（sw_bitは0..7で全埋まりなので固定長リスト）
+        self.swbit_to_index = [0] * 8
+        for pc in self.pcs:
+            self.swbit_to_index[pc.sw_bit] = pc.index
+
+        # PCごとのピン状態は完全に静的なので、ルーティング手順を
+        # (Pinオブジェクト, 値) のタプル列として事前計算しておく。
+        # 切替時は文字列比較・シフト演算なしでタプルを流すだけになる。
+        for pc in self.pcs:
+            mux = self.muxA if pc.mux_side == 'A' else self.muxB
+            # 事前設定: HC137アドレス / MUXセレクタ / TS3側 (全て無効状態のまま)
+            pc._pre_ops = (
+                (self.hc137.a0, (pc.hc_addr >> 0) & 1),
+                (self.hc137.a1, (pc.hc_addr >> 1) & 1),
+                (self.hc137.a2, (pc.hc_addr >> 2) & 1),
+                (mux.s0, (pc.mux_sel >> 0) & 1),
+                (mux.s1, (pc.mux_sel >> 1) & 1),
+                (self.ts3.s, 1 if pc.ts3_side == 'A' else 0),
+            )
+            # 有効化: 選択側MUX → VBUS (TS3は小休止後に別途ON)
+            pc._enable_ops = (
+                (mux.en_n, 0),
+                (self.hc137.e1_n, 0),
+            )
+
+        # ==== 状態 ====
+        self.selected = -1  # -1: 全切断
+        self.last_sw_state = self.io.read_gpioa()  # 1=未押下(プルアップ)
+        self.debounce_ms = 25
+        self._pending = False  # SW読出しのスケジュール済みフラグ（再入防止）
+        self._route_pending = None       # TS3有効化待ちのPC (Noneなら待ちなし)
+        self._route_timer = Timer(-1)    # 2ms整定待ち用ワンショット
+        self._last_status_tuple = None   # 前回のデバッグ表示内容（差分検出用）
+
+        # 安全初期化: 全切断＋LED全消灯
+        self._disconnect_all()
+        self._update_leds()
+
+        # 割り込み設定
+        self.inta_pin.irq(handler=self._on_mcp_int, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
+
+    # ---------- 内部: 切断／選択 ----------
+    def _disconnect_all(self):
+        # 進行中の切替があれば破棄
+        self._route_pending = None
+        self._route_timer.deinit()
+        # 経路OFF
+        self.ts3.disable()
+        self.muxA.disable()
+        self.muxB.disable()
+        # VBUS全OFF
+        self.hc137.disable()  # ~E1 High
+        self.selected = -1
+
+    def _route_stage1(self, pc: PC):
+        # 直前のハード状態（整定待ち中ならそのPC、確定済みなら選択中PC）
+        prev = self._route_pending
+        ts3_live = prev is None and self.selected >= 0  # TS3が現在有効か
+        if prev is None and self.selected >= 0:
+            prev = self.pcs[self.selected]
+        self._route_timer.deinit()
+        self._route_pending = None
+
+        # TS3のS切替が不要（同側遷移）なら経路を切らずに済み、
+        # 2ms整定待ちも丸ごと省略できる
+        keep_ts3 = ts3_live and prev.ts3_side == pc.ts3_side
+
+        # 1) 経路OFF（必要な分だけ）
+        if not keep_ts3:
+            self.ts3.disable()
+        # 反対側MUXのみ無効化（同側継続なら切断せずセレクタだけ更新）
+        if pc.mux_side == 'A':
+            self.muxB.disable()
+        else:
+            self.muxA.disable()
+        # VBUSはアドレス切替中のグリッチ（誤ch瞬時給電）防止のため常に一旦OFF
+        self.hc137.disable()
+
+        # 2) 事前設定（アドレス/セレクタ/TS3側: 事前計算済みのピン手順を流す）
+        for p, v in pc._pre_ops:
+            p.value(v)
+
+        # 3) 選択側MUXとVBUSを有効化（選択YのみLowになる・再書込は無害）
+        for p, v in pc._enable_ops:
+            p.value(v)
+
+        if keep_ts3:
+            # TS3は有効のまま: 整定待ちなしで即時確定
+            self._route_commit(pc)
+        else:
+            # 4) 2ms整定はブロッキングsleepではなくワンショットタイマで待ち、
+            #    その間メインループはstdin等の処理を継続できる
+            self._route_pending = pc
+            self._route_timer.init(mode=Timer.ONE_SHOT, period=2,
+                                   callback=self._route_timer_cb)
+
+    def _route_timer_cb(self, t):
+        try:
+            micropython.schedule(self._route_stage2_bh, 0)
+        except RuntimeError:
+            self._route_stage2_bh(0)  # scheduleキュー満杯時は直接完了させる
+
+    def _route_stage2_bh(self, _):
+        pc = self._route_pending
+        if pc is None:
+            return  # 途中でdisconnect/再切替された
+        self._route_pending = None
+        # 経路ON（整定後）
+        self.ts3.enable()
+        self._route_commit(pc)
+
+    def _route_commit(self, pc: PC):
+        self.selected = pc.index
+        self._update_leds()
+        # __debug__先置きで-O2+ビルドでは分岐ごと除去される
+        if __debug__ and self.debug_mode:
+            pc.debug_print()
+
+    def _update_leds(self):
+        self.io.set_led_only(self.selected)
+
+    # ---------- 公開API ----------
+    def select_pc(self, idx: int):
+        if not (0 <= idx < len(self.pcs)):
+            self._disconnect_all()
+            self._update_leds()
+        elif idx != self.selected:
+            # LED更新・selected確定は整定タイマ満了後の_route_stage2_bhで行う
+            self._route_stage1(self.pcs[idx])
+
+    def disconnect(self):
+        self._disconnect_all()
+        self._update_leds()
+
+    # 状態表示テンプレート（1回のformat/printで済ませ、都度の
+    # 中間str生成とUSB CDCへの複数回フラッシュを避ける）
+    _STATUS_FMT = ("\n--- Usb8Selector Status ---[{}]\n"
+                   "Selected PC: {}\n"
+                   "TS3USB30: OE={}, S={}\n"
+                   "Mux A: ~EN={}, S1={}, S0={}\n"
+                   "Mux B: ~EN={}, S1={}, S0={}\n"
+                   "HC137: ~E1={}, A2={}, A1={}, A0={}\n"
+                   "MCP23017: Last SW state (GPIOA) = 0b{:08b}\n"
+                   "--------------------------")
+
+    def debug_print_status(self, force=False):
+        # 現在状態を1タプルに集約し、前回出力から変化がなければ
+        # 何も出さない（USB CDC書込が最も遅いので省くのが一番効く）。
+        # コンソールのstatusコマンドはforce=Trueで常に出力。
+        tup = (self.selected,
+               self.ts3.oe.value(), self.ts3.s.value(),
+               self.muxA.en_n.value(), self.muxA.s1.value(), self.muxA.s0.value(),
+               self.muxB.en_n.value(), self.muxB.s1.value(), self.muxB.s0.value(),
+               self.hc137.e1_n.value(), self.hc137.a2.value(), self.hc137.a1.value(), self.hc137.a0.value(),
+               self.last_sw_state)
+        if not force and tup == self._last_status_tuple:
+            return
+        self._last_status_tuple = tup
+        print(self._STATUS_FMT.format(utime.ticks_ms(), *tup))
+
+    # ---------- 割り込み処理 ----------
+    def _schedule_sw_read(self):
+        """ SW読出しボトムハーフをスケジュール（ISR/メインループ共用） """
+        if self._pending:
+            return
+        self._pending = True
+        try:
+            micropython.schedule(self._handle_sw_bh, 0)
+        except RuntimeError:
+            self._pending = False  # scheduleキュー満杯: 次の契機で再試行
+
+    def _on_mcp_int(self, pin):
+        # ISRではフラグを立ててスケジュールするだけ。
+        # デバウンスのsleepやI2CアクセスはIRQ文脈では禁止（割込ブロック/アロケーション不可）。
+        self._schedule_sw_read()
+
+    def _handle_sw_bh(self, _):
+        # ボトムハーフ（通常文脈）: デバウンス→読出し→エッジ判定→切替
+        try:
+            utime.sleep_ms(self.debounce_ms)       # デバウンス
+            self._process_sw_state()
+        finally:
+            self._pending = False
+
+    @micropython.viper
+    def _pressed_mask(self, intf: int, cap: int) -> int:
+        # 要因ピンかつ現在Low(押下)のビットのみ残す。
+        # viperはuint演算をネイティブThumb命令に落とすため
+        # PyObjectの確保なしで実行される
+        return intf & (~cap) & 0xFF
+
+    @micropython.viper
+    def _msb(self, x: int) -> int:
+        # 最上位セットビットの位置 (x==0なら-1)
+        n = -1
+        while x:
+            x >>= 1
+            n += 1
+        return n
+
+    def _process_sw_state(self):
+        # INTCON/DEFVAL設定により割り込みは押下(1→0)エッジのみ。
+        # INTFが要因ピン、INTCAPが発生時点の状態。読出しでラッチ解除も兼ねる。
+        intf, cap = self.io.read_int_status()  # cap: 1=未押下, 0=押下
+        pressed = self._pressed_mask(intf, cap)
+        if pressed:
+            # 同時押し時は最上位bit(GPA7側=SW0)優先
+            bit = self._msb(pressed)
+            mask = 1 << bit
+            # 仕様は「離したタイミングで選択」: 離される(=1に戻る)まで
+            # デバウンス間隔でポーリングしてから確定する。
+            # 押下中の再割り込みは_pendingフラグで抑止されている。
+            while True:
+                utime.sleep_ms(self.debounce_ms)
+                state = self.io.read_gpioa()
+                if state & mask:
+                    break
+            self.last_sw_state = state  # デバッグ表示用
+            self.select_pc(self.swbit_to_index[bit])
+        else:
+            self.last_sw_state = cap
+
+# ========= エントリポイント =========
+def main():
+    sel = Usb8Selector(DEBUG_MODE)
+    print("USB HID 8台切替セレクタ：起動完了（初期は全切断・LED全消灯）。")
+    print("コンソールからコマンド入力可能 (helpで一覧)")
+
+    # 標準入力のポーリング準備
+    poller = select.poll()
+    poller.register(sys.stdin, select.POLLIN)
+
+    def print_help():
+        print("\n--- Console Commands ---")
+        print("  help          : このヘルプを表示")
+        print("  status        : 現在の状態を表示")
+        print("  select <0-7>  : PCを選択")
+        print("  disconnect    : 全てのPCを切断")
+        print("------------------------")
+
+    # ループ内で毎回モジュール属性を引かないようローカルに束縛
+    ticks_ms = utime.ticks_ms
+    ticks_diff = utime.ticks_diff
+    ticks_add = utime.ticks_add
+
+    try:
+        last_print_time = ticks_ms()
+        while True:
+            # 次のデバッグ表示時刻までブロッキング待機（stdin入力で即時復帰）
+            # → 100msスリープのポーリングよりCPUを起こさず、コンソール遅延もゼロ
+            # ただしINTAフォールバック検査のため最長100msで一旦起きる
+            timeout = ticks_diff(ticks_add(last_print_time, 5000), ticks_ms())
+            events = poller.poll(min(100, max(0, timeout)))
+
+            # INTAレベルの直接確認: エッジ割り込みを取りこぼしても
+            # ラッチされたINTA=Lowをここで拾って復帰する（安全網）
+            if sel.inta_pin.value() == 0 and not sel._pending:
+                sel._schedule_sw_read()
+
+            # コンソールからのコマンド処理
+            if events:
+                cmd = sys.stdin.readline().strip()
+                parts = cmd.split()
+                if not parts:
+                    continue
+
+                if parts[0] == "help":
+                    print_help()
+                elif parts[0] == "status":
+                    sel.debug_print_status(force=True)
+                elif parts[0] == "disconnect":
+                    sel.disconnect()
+                    print("コンソールコマンド: 全切断しました。")
+                elif parts[0] == "select" and len(parts) > 1:
+                    try:
+                        idx = int(parts[1])
+                        if 0 <= idx <= 7:
+                            sel.select_pc(idx)
+                            print("コンソールコマンド: PC{}を選択しました。".format(idx))
+                        else:
+                            print("エラー: PC番号は0-7で指定してください。")
+                    except ValueError:
+                        print("エラー: PC番号が不正です。")
+                else:
+                    print("エラー: 不明なコマンド '{}'".format(cmd))
+
+            # 5秒ごとに状態をデバッグ表示
+            if ticks_diff(ticks_ms(), last_print_time) > 5000:
+                if __debug__ and DEBUG_MODE:
+                    sel.debug_print_status()
+                last_print_time = ticks_ms()
+
+    except KeyboardInterrupt:
+        sel.disconnect()
+        print("終了：全切断。")
+
+if __name__ == "__main__":
+    main()